@@ -1,53 +1,119 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-from qiskit import QuantumCircuit, transpile
-from qiskit_aer import AerSimulator
-from qiskit.quantum_info import Statevector
-
-def encode_b92_with_alice_basis(alice_bits, alice_bases):
-    """Encodes a bit string into B92 quantum states based on Alice's bases."""
-    qc = QuantumCircuit(len(alice_bits), len(alice_bits))
-    for i, (bit, basis) in enumerate(zip(alice_bits, alice_bases)):
+
+rng = np.random.default_rng()
+_BIN_RE = re.compile(r'[01]+')
+_B92_STATE_LUT = np.array(['H', '+'], dtype='U1')  # Alice's sent state per basis
+
+def validate_b92_inputs(alice_bits, alice_bases):
+    """Checks that Alice's bits are consistent with her B92 bases."""
+    for bit, basis in zip(alice_bits, alice_bases):
         if basis == 0:  # Alice chooses '0' basis (implicitly |H>)
             if bit == '1':
                 raise ValueError("Inconsistent input: bit '1' with basis '0' in B92")
-            # Encode '0' as |H> (no operation needed)
         elif basis == 1:  # Alice chooses '1' basis (implicitly |+>)
             if bit == '0':
                 raise ValueError("Inconsistent input: bit '0' with basis '1' in B92")
-            # Encode '1' as |+>
-            qc.h(i)
         else:
             raise ValueError("Invalid Alice's basis. Must be 0 or 1 for B92.")
-    return qc
 
+def encode_b92_with_alice_basis(alice_basis):
+    """Encodes a single B92 state on one qubit based on Alice's basis."""
+    from qiskit import QuantumCircuit
 
-def measure_b92(circuit, num_qubits, measurement_bases):
-    """Measures B92 encoded qubits in given bases."""
-    meas = QuantumCircuit(num_qubits, num_qubits)
-    bob_results = []
-    for i, basis in enumerate(measurement_bases):
-        if basis == 0:  # Measure in {|V>, |H>} basis (Z basis)
-            meas.measure(i, i)
-        elif basis == 1:  # Measure in {|->, |+>} basis (X basis after Hadamard)
-            meas.h(i)
-            meas.measure(i, i)
-        else:
-            raise ValueError("Invalid measurement basis. Must be 0 or 1.")
+    qc = QuantumCircuit(1, 1)
+    if alice_basis == 0:  # Encode '0' as |H> (no operation needed)
+        pass
+    elif alice_basis == 1:  # Encode '1' as |+>
+        qc.h(0)
+    else:
+        raise ValueError("Invalid Alice's basis. Must be 0 or 1 for B92.")
+    return qc
 
-    combined_circuit = circuit.compose(meas)
-    simulator = AerSimulator()
-    compiled_circuit = transpile(combined_circuit, simulator)
-    job = simulator.run(compiled_circuit, shots=1, memory=True)
-    result = job.result()
-    measurement = result.get_memory(combined_circuit)[0]
-    return measurement
+
+def sample_b92(alice_bases, bob_bases, rng):
+    """Samples Bob's B92 results in closed form without a simulator."""
+    alice_bases = np.asarray(alice_bases)
+    bob_bases = np.asarray(bob_bases)
+    # |H> in Z and |+> in X always read '0'; mismatched bases give a fair coin.
+    return np.where(alice_bases == bob_bases, 0, rng.integers(0, 2, size=len(alice_bases)))
+
+@lru_cache(maxsize=4)
+def _b92_template(alice_basis, bob_basis):
+    """Builds and transpiles the one-qubit circuit for an (Alice, Bob) basis pair."""
+    from qiskit import transpile
+    from qiskit_aer import AerSimulator
+
+    qc = encode_b92_with_alice_basis(alice_basis)
+    if bob_basis == 0:  # Measure in {|V>, |H>} basis (Z basis)
+        qc.measure(0, 0)
+    elif bob_basis == 1:  # Measure in {|->, |+>} basis (X basis after Hadamard)
+        qc.h(0)
+        qc.measure(0, 0)
+    else:
+        raise ValueError("Invalid measurement basis. Must be 0 or 1.")
+
+    return transpile(qc, AerSimulator(method='stabilizer'))
+
+def measure_b92(alice_bases, measurement_bases, use_analytic=True):
+    """Measures B92 states in given bases, one multi-shot job per (Alice, Bob) basis pair."""
+    if use_analytic:
+        bob_results = sample_b92(alice_bases, measurement_bases, rng).astype(np.uint8)
+        return (bob_results + 48).tobytes().decode('ascii')
+
+    # Qiskit is imported lazily so the analytic path never loads it
+    from qiskit_aer import AerSimulator
+
+    # B92 states are single-qubit product states, so transmissions sharing a
+    # basis pair are independent shots of the same one-qubit circuit.
+    groups = {}
+    for i, (alice_basis, bob_basis) in enumerate(zip(alice_bases, measurement_bases)):
+        groups.setdefault((alice_basis, bob_basis), []).append(i)
+
+    # Submit every group with its exact shot count before collecting any
+    # result; Aer's default job executor has a single worker, so passing our
+    # own pool lets the groups run concurrently (Aer releases the GIL).
+    simulator = AerSimulator(method='stabilizer')
+    bob_results = np.empty(len(measurement_bases), np.uint8)
+    with ThreadPoolExecutor(max_workers=min(len(groups), os.cpu_count())) as executor:
+        jobs = [(simulator.run(_b92_template(alice_basis, bob_basis), shots=len(indices),
+                               memory=True, executor=executor), indices)
+                for (alice_basis, bob_basis), indices in groups.items()]
+        for job, indices in jobs:
+            memory = ''.join(job.result().get_memory(0))
+            bob_results[indices] = np.frombuffer(memory.encode('ascii'), np.uint8)
+    return bob_results.tobytes().decode('ascii')
+
+def sift_b92(alice_bases, bob_bases, bob_results):
+    """Returns the conclusive indices and Bob's received bits for B92."""
+    # A '1' in the basis opposite to Alice's rules out her other state, so the
+    # received bit equals her basis.
+    alice_bases = np.asarray(alice_bases, np.uint8)
+    conclusive = (alice_bases != np.asarray(bob_bases, np.uint8)) & (np.asarray(bob_results, np.uint8) == 1)
+    return np.flatnonzero(conclusive), alice_bases[conclusive]
+
+def compare_keys(key_a, key_b):
+    """Compares two equal-length bit keys bitpacked, returning (match, error rate)."""
+    if len(key_a) != len(key_b):
+        raise ValueError(f"Keys must have the same length, got {len(key_a)} and {len(key_b)}.")
+    packed_a = np.packbits(np.asarray(key_a, np.uint8))
+    packed_b = np.packbits(np.asarray(key_b, np.uint8))
+    errors = int(np.unpackbits(packed_a ^ packed_b).sum())
+    return errors == 0, errors / len(key_a) if len(key_a) else 0.0
+
+def key_to_str(key):
+    """Formats a uint8 bit key as a '0'/'1' string."""
+    return (np.asarray(key, np.uint8) + 48).tobytes().decode('ascii')
 
 def get_user_alice_bases(num_bits):
     """Gets Alice's bases from the user."""
     while True:
         bases_str = input(f"Enter Alice's bases for {num_bits} bits (0 or 1, e.g., 0110): ").strip()
-        if len(bases_str) == num_bits and all(base in ['0', '1'] for base in bases_str):
-            return [int(base) for base in list(bases_str)]
+        if len(bases_str) == num_bits and _BIN_RE.fullmatch(bases_str):
+            return (np.frombuffer(bases_str.encode(), np.uint8) - 48).tolist()
         else:
             print(f"Invalid input. Please enter a string of {num_bits} '0's and '1's.")
 
@@ -55,7 +121,7 @@ def get_user_alice_bits(num_bits):
     """Gets Alice's bits from the user."""
     while True:
         bits_str = input(f"Enter Alice's secret bits for {num_bits} transmissions (0 or 1, e.g., 0110): ").strip()
-        if len(bits_str) == num_bits and all(bit in ['0', '1'] for bit in bits_str):
+        if len(bits_str) == num_bits and _BIN_RE.fullmatch(bits_str):
             return list(bits_str)
         else:
             print(f"Invalid input. Please enter a string of {num_bits} '0's and '1's.")
@@ -64,8 +130,8 @@ def get_user_bob_bases(num_bits):
     """Gets Bob's measurement bases from the user."""
     while True:
         bases_str = input(f"Enter Bob's measurement bases for {num_bits} bits (0 for Z, 1 for X, e.g., 0110): ").strip()
-        if len(bases_str) == num_bits and all(base in ['0', '1'] for base in bases_str):
-            return [int(base) for base in list(bases_str)]
+        if len(bases_str) == num_bits and _BIN_RE.fullmatch(bases_str):
+            return (np.frombuffer(bases_str.encode(), np.uint8) - 48).tolist()
         else:
             print(f"Invalid input. Please enter a string of {num_bits} '0's and '1's.")
 
@@ -85,25 +151,15 @@ def b92_protocol_user_input_bases_bits_bob():
     alice_bits = get_user_alice_bits(num_bits)
     bob_measurement_bases = get_user_bob_bases(num_bits)
 
-    alice_sent_states = []
-    for basis in alice_bases:
-        if basis == 0:
-            alice_sent_states.append('H')
-        elif basis == 1:
-            alice_sent_states.append('+')
-        else:
-            raise ValueError("Invalid Alice's basis.")
+    alice_sent_states = _B92_STATE_LUT[np.asarray(alice_bases, np.int8)].tolist()
 
     try:
-        quantum_channel = encode_b92_with_alice_basis(alice_bits, alice_bases)
+        validate_b92_inputs(alice_bits, alice_bases)
     except ValueError as e:
-        print(f"Error during encoding: {e}")
-        return "", ""
-
-    bob_measurements = measure_b92(quantum_channel, num_bits, bob_measurement_bases)
+        print(f"Invalid input: {e}")
+        return np.empty(0, np.uint8), np.empty(0, np.uint8)
 
-    bob_received_bits = []
-    bob_conclusive_indices = []
+    bob_measurements = measure_b92(alice_bases, bob_measurement_bases)
 
     print("\n--- Transmission and Measurement ---")
     print(f"Number of transmissions: {num_bits}")
@@ -114,42 +170,32 @@ def b92_protocol_user_input_bases_bits_bob():
     print(f"Bob's raw measurements:  {bob_measurements}")
 
     # Bob keeps only conclusive measurements
-    for i in range(num_bits):
-        alice_state = alice_sent_states[i]
-        bob_basis = bob_measurement_bases[i]
-        bob_result = bob_measurements[i]
-
-        if alice_state == 'H' and bob_basis == 1 and bob_result == '1':
-            bob_received_bits.append('0')
-            bob_conclusive_indices.append(i)
-        elif alice_state == '+' and bob_basis == 0 and bob_result == '1':
-            bob_received_bits.append('1')
-            bob_conclusive_indices.append(i)
-        else:
-            pass # Inconclusive result
+    bob_arr = np.frombuffer(bob_measurements.encode(), np.uint8) - ord('0')
+    conclusive_indices, received_key = sift_b92(alice_bases, bob_measurement_bases, bob_arr)
 
     print("\n--- Key Generation ---")
-    print(f"Bob's conclusive measurement indices: {bob_conclusive_indices}")
-    print(f"Bob's received bits (raw key):     {''.join(bob_received_bits)}")
-
-    agreed_alice_key = [alice_bits[i] for i in bob_conclusive_indices]
-    print(f"Alice's corresponding bits (raw key): {''.join(agreed_alice_key)}")
+    print(f"Bob's conclusive measurement indices: {conclusive_indices.tolist()}")
+    print(f"Bob's received bits (raw key):     {key_to_str(received_key)}")
 
-    final_key_alice = "".join(agreed_alice_key)
-    final_key_bob = "".join(bob_received_bits)
+    alice_bits_arr = np.frombuffer(''.join(alice_bits).encode(), np.uint8) - ord('0')
+    agreed_alice_key = alice_bits_arr[conclusive_indices]
+    print(f"Alice's corresponding bits (raw key): {key_to_str(agreed_alice_key)}")
 
-    return final_key_alice, final_key_bob
+    return agreed_alice_key, received_key
 
 if __name__ == "__main__":
     alice_final_key, bob_final_key = b92_protocol_user_input_bases_bits_bob()
 
     print("\n--- Final Key ---")
-    print(f"Alice's final key (agreed): {alice_final_key}")
-    print(f"Bob's final key (received):   {bob_final_key}")
+    print(f"Alice's final key (agreed): {key_to_str(alice_final_key)}")
+    print(f"Bob's final key (received):   {key_to_str(bob_final_key)}")
 
-    if alice_final_key == bob_final_key and alice_final_key:
-        print("Key exchange successful (based on conclusive measurements).")
-    elif not alice_final_key:
+    if len(alice_final_key) == 0:
         print("Key exchange failed (no conclusive measurements).")
     else:
-        print("Potential errors or inconclusive measurements.")
\ No newline at end of file
+        keys_match, qber = compare_keys(alice_final_key, bob_final_key)
+        print(f"Quantum bit error rate (QBER): {qber:.2%}")
+        if keys_match:
+            print("Key exchange successful (based on conclusive measurements).")
+        else:
+            print("Potential errors or inconclusive measurements.")
\ No newline at end of file
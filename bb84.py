@@ -1,77 +1,94 @@
-import random
-from qiskit import QuantumCircuit, transpile
-from qiskit_aer import AerSimulator
-from qiskit.quantum_info import Statevector
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+
+rng = np.random.default_rng()
+_BIN_RE = re.compile(r'[01]+')
 
 # function for getting user bits for multiple qubits
 def get_user_bits_multi(num_bits, entity_name):
     while True:
         bits_str = input(f"Enter {num_bits} binary bits for {entity_name} (e.g., 01010101): ")
-        if len(bits_str) == num_bits and all(bit in '01' for bit in bits_str):
-            return [int(bit) for bit in bits_str]
+        if len(bits_str) == num_bits and _BIN_RE.fullmatch(bits_str):
+            return (np.frombuffer(bits_str.encode(), np.uint8) - 48).tolist()
         else:
             print(f"Invalid input. Please enter exactly {num_bits} binary bits.")
 
 def get_user_bases_multi(num_bits, entity_name):
     while True:
         bases_str = input(f"Enter {num_bits} bases for {entity_name} (0 for +, 1 for x, e.g., 01100110): ")
-        if len(bases_str) == num_bits and all(base in '01' for base in bases_str):
-            return [int(base) for base in bases_str]
+        if len(bases_str) == num_bits and _BIN_RE.fullmatch(bases_str):
+            return (np.frombuffer(bases_str.encode(), np.uint8) - 48).tolist()
         else:
             print(f"Invalid input. Please enter exactly {num_bits} bases (0 or 1).")
 
-# 1. Sam's Transmission (using multiple qubits)
-def Sam_transmission_multi_qubit(Sam_bits, Sam_bases):
-    num_bits = len(Sam_bits)
-    num_qubits = num_bits  # Each bit will be on a separate qubit
-    qc = QuantumCircuit(num_qubits, num_qubits)
-    ''' '''
-    Sam_transmitted_circuits = []
-
-    for i in range(num_qubits):
-        bit = Sam_bits[i]
-        basis = Sam_bases[i]
-
-        if basis == 0:  # Rectilinear basis (+)
-            if bit == 1:
-                qc.x(i)
-        else:  # Diagonal basis (x)
-            if bit == 0:
-                qc.h(i)
-            else:
-                qc.h(i)
-                qc.z(i)
-    Sam_transmitted_circuits.append(qc) # Only one circuit for all transmitted qubits
-    return Sam_transmitted_circuits
-
-# 2. Ron's Measurement (using multiple qubits and simulated noise)
-def Ron_measurement_multi_qubit_with_noise(transmitted_circuits, Ron_bases, noise_probability=0.1):
-    Ron_results = []
-    simulator = AerSimulator()
-    qc = transmitted_circuits[0].copy() # Get the single multi-qubit circuit
-    num_qubits = qc.num_qubits
-
-    for i in range(num_qubits):
-        basis = Ron_bases[i]
-        if basis == 1:  # Diagonal basis (x) measurement
-            qc.h(i)
-        qc.measure(i, i)
-
-    compiled_circuit = transpile(qc, simulator)
-    job = simulator.run(compiled_circuit, shots=1)
-    result = job.result()
-    counts = result.get_counts(qc)
-    measured_str = list(counts.keys())[0] # Get the measured bit string
-    measured_bits = [int(bit) for bit in reversed(measured_str)] # Reverse to match qubit order
-
-    noisy_results = []
-    for bit in measured_bits:
-        if random.random() < noise_probability:
-            noisy_results.append(1 - bit)
+# 1. Sam's Transmission (prepares one of Sam's states on a single-qubit circuit)
+def _encode_bb84_state(bit, basis):
+    from qiskit import QuantumCircuit
+
+    qc = QuantumCircuit(1, 1)
+    if basis == 0:  # Rectilinear basis (+)
+        if bit == 1:
+            qc.x(0)
+    else:  # Diagonal basis (x)
+        if bit == 0:
+            qc.h(0)
         else:
-            noisy_results.append(bit)
+            qc.h(0)
+            qc.z(0)
+    return qc
+
+# Builds and transpiles the measured one-qubit circuit once per (Sam basis, Ron basis, Sam bit)
+@lru_cache(maxsize=8)
+def _bb84_template(Sam_basis, Ron_basis, Sam_bit):
+    from qiskit import transpile
+    from qiskit_aer import AerSimulator
+
+    qc = _encode_bb84_state(Sam_bit, Sam_basis)
+    if Ron_basis == 1:  # Diagonal basis (x) measurement
+        qc.h(0)
+    qc.measure(0, 0)
+    return transpile(qc, AerSimulator(method='stabilizer'))
+
+# Closed-form measurement: matching bases return Sam's bit, otherwise a fair coin
+def sample_bb84(Sam_bits, Sam_bases, Ron_bases, rng):
+    Sam_bits = np.asarray(Sam_bits)
+    matched = np.asarray(Sam_bases) == np.asarray(Ron_bases)
+    return np.where(matched, Sam_bits, rng.integers(0, 2, size=len(Sam_bits)))
 
-    return noisy_results
+# 2. Ron's Measurement (using multiple qubits and simulated noise)
+def Ron_measurement_multi_qubit_with_noise(Sam_bits, Sam_bases, Ron_bases, noise_probability=0.1, use_analytic=True):
+    if use_analytic:
+        measured_bits = sample_bb84(Sam_bits, Sam_bases, Ron_bases, rng)
+    else:
+        # Qiskit is imported lazily so the analytic path never loads it
+        from qiskit_aer import AerSimulator
+
+        # Group qubits by (Sam's basis, Ron's basis, Sam's bit) and run each
+        # group as shots of a one-qubit circuit instead of one 2^N statevector
+        groups = {}
+        for i, key in enumerate(zip(Sam_bases, Ron_bases, Sam_bits)):
+            groups.setdefault(key, []).append(i)
+
+        # Submit every group with its exact shot count before collecting any
+        # result; Aer's default job executor has a single worker, so our own
+        # thread pool lets the groups run concurrently (Aer releases the GIL)
+        simulator = AerSimulator(method='stabilizer')
+        measured_bits = np.empty(len(Ron_bases), np.uint8)
+        with ThreadPoolExecutor(max_workers=min(len(groups), os.cpu_count())) as executor:
+            jobs = [(simulator.run(_bb84_template(*key), shots=len(indices),
+                                   memory=True, executor=executor), indices)
+                    for key, indices in groups.items()]
+            for job, indices in jobs:
+                memory = ''.join(job.result().get_memory(0))
+                measured_bits[indices] = np.frombuffer(memory.encode('ascii'), np.uint8) - 48
+
+    # Flip each bit with probability noise_probability using one XOR mask
+    measured_arr = np.asarray(measured_bits, np.uint8)
+    noise_mask = (rng.random(len(measured_arr)) < noise_probability).astype(np.uint8)
+    return (measured_arr ^ noise_mask).tolist()
 
 # 3. Basis Reconciliation (remains the same logic)
 def basis_reconciliation(Sam_bases, Ron_bases, Sam_bits, Ron_results):
@@ -83,6 +100,15 @@ def basis_reconciliation(Sam_bases, Ron_bases, Sam_bits, Ron_results):
             shared_key_Ron.append(Ron_results[i])
     return shared_key_Sam, shared_key_Ron
 
+# 4. Key Comparison (bitpacked; mismatches counted with one XOR + popcount)
+def compare_keys(key_a, key_b):
+    if len(key_a) != len(key_b):
+        raise ValueError(f"Keys must have the same length, got {len(key_a)} and {len(key_b)}.")
+    packed_a = np.packbits(np.asarray(key_a, np.uint8))
+    packed_b = np.packbits(np.asarray(key_b, np.uint8))
+    errors = int(np.unpackbits(packed_a ^ packed_b).sum())
+    return errors == 0, errors / len(key_a) if len(key_a) else 0.0
+
 # --- Main Execution with User Input and Noise (Multiple Qubits) ---
 num_bits = 29  # Example with 8 bits (and thus 8 qubits)
 noise_level = 0
@@ -91,14 +117,13 @@ noise_level = 0
 print("--- Sam's Input ---")
 Sam_bits = get_user_bits_multi(num_bits, "Sam")
 Sam_bases = get_user_bases_multi(num_bits, "Sam")
-Sam_transmitted_circuits = Sam_transmission_multi_qubit(Sam_bits, Sam_bases)
 print("\nSam's generated bits:", Sam_bits)
 print("\nSam's chosen bases:", Sam_bases)
 
 # Ron's step
 print("\n--- Ron's Input ---")
 Ron_bases = get_user_bases_multi(num_bits, "Ron")
-Ron_measured_results = Ron_measurement_multi_qubit_with_noise(Sam_transmitted_circuits, Ron_bases, noise_level)
+Ron_measured_results = Ron_measurement_multi_qubit_with_noise(Sam_bits, Sam_bases, Ron_bases, noise_level)
 print("\nRon's chosen bases:", Ron_bases)
 print("\nRon's measurement results:", Ron_measured_results)
 
@@ -113,7 +138,9 @@ print("\nLength of Ron's raw measurements:", len(Ron_measured_results))
 print("\nLength of shared raw key:", len(shared_key_Sam))
 
 # Verify if the shared keys match (now accounting for noise)
-if shared_key_Sam == shared_key_Ron:
+keys_match, qber = compare_keys(shared_key_Sam, shared_key_Ron)
+print(f"\nQuantum bit error rate (QBER): {qber:.2%}")
+if keys_match:
     print("\nShared keys match!")
 else:
     print("\nShared keys do NOT match (due to simulated noise or different user inputs).")
\ No newline at end of file
@@ -1,9 +1,6 @@
 import random
+from functools import lru_cache
 import numpy as np
-from qiskit import QuantumCircuit, transpile
-from qiskit_aer import AerSimulator
-from qiskit.quantum_info import Statevector
-from scipy.stats import chisquare
 
 # --- Define Measurement Bases in Qiskit ---
 basis_hv = [[("rz", 0, 0)], [("rx", np.pi, 0)]]  # Z and X basis
@@ -13,11 +10,16 @@ basis_circular = [[("ry", np.pi/4, 0), ("sx", 0, 0)], [("ry", -np.pi/4, 0), ("sx
 all_bases = [basis_hv, basis_pm, basis_circular]
 base_names = ["HV", "+/-", "Circular"]
 
+# Basis index pairs (Alice, Bob) that enter the CHSH-like statistic
+_E91_VALID_PAIRS = np.array([[0, 1, 1], [1, 0, 1], [1, 1, 0]], dtype=bool)
+
 # Measurement operators for Bell test (simplified to Pauli operators)
 bell_ops = [("Z", "Z"), ("Z", "X"), ("X", "Z"), ("X", "X")]
 
 def create_bell_pair(state="psi_minus"):
     """Creates Bell pairs with classical bits for measurement."""
+    from qiskit import QuantumCircuit
+
     qc = QuantumCircuit(2, 2)  # Create a circuit with 2 qubits and 2 classical bits
     if state == "phi_plus":
         qc.h(0)
@@ -39,6 +41,8 @@ def create_bell_pair(state="psi_minus"):
 
 def measure_qubit(circuit, qubit, basis, cbit):
     """Adds measurement gates based on the basis, measuring to a specific classical bit."""
+    from qiskit import QuantumCircuit
+
     if basis == basis_hv:
         circuit.measure(qubit, cbit)
     elif basis == basis_pm:
@@ -54,37 +58,42 @@ def measure_qubit(circuit, qubit, basis, cbit):
         circuit.compose(meas, qubits=[qubit], clbits=[cbit], inplace=True)
     return circuit
 
+@lru_cache(maxsize=36)
+def _bell_template(state, alice_basis_idx, bob_basis_idx):
+    """Builds and transpiles a measured Bell pair once per (state, Alice basis, Bob basis)."""
+    from qiskit import transpile
+    from qiskit_aer import AerSimulator
+
+    qc = create_bell_pair(state)
+    measure_qubit(qc, 0, all_bases[alice_basis_idx], 0)
+    measure_qubit(qc, 1, all_bases[bob_basis_idx], 1)
+    return transpile(qc, AerSimulator())
+
 def simulate_measurement(circuit, backend, shots=1):
     """Simulates measurement."""
+    from qiskit import transpile
+
     compiled_circuit = transpile(circuit, backend)
     job = backend.run(compiled_circuit, shots=shots, memory=True)
     result = job.result()
     measurements = result.get_memory(circuit)
     return measurements[0]
 
-def evaluate_bell_statistic(bell_data):
+def evaluate_bell_statistic(alice_bases, alice_results, bob_bases, bob_results):
     """A simplified way to estimate a Bell-like statistic."""
-    correlations = []
-    for (alice_basis_idx, alice_result), (bob_basis_idx, bob_result) in bell_data:
-        a_val = 1 if alice_result == '0' else -1
-        b_val = 1 if bob_result == '0' else -1
-
-        # Consider specific basis combinations for a CHSH-like parameter
-        if (alice_basis_idx == 0 and bob_basis_idx == 1) or \
-           (alice_basis_idx == 0 and bob_basis_idx == 2) or \
-           (alice_basis_idx == 1 and bob_basis_idx == 2) or \
-           (alice_basis_idx == 1 and bob_basis_idx == 0) or \
-           (alice_basis_idx == 2 and bob_basis_idx == 0) or \
-           (alice_basis_idx == 2 and bob_basis_idx == 1):
-            correlations.append(a_val * b_val)
-
-    if correlations:
-        return np.mean(correlations) * np.sqrt(2) # Rough estimate related to S in CHSH
+    # Map results '0'/'1' to +1/-1
+    a_vals = 1 - 2 * np.asarray(alice_results, dtype=np.int8)
+    b_vals = 1 - 2 * np.asarray(bob_results, dtype=np.int8)
+
+    # Consider specific basis combinations for a CHSH-like parameter
+    mask = _E91_VALID_PAIRS[np.asarray(alice_bases, dtype=np.intp), np.asarray(bob_bases, dtype=np.intp)]
+    if mask.any():
+        return (a_vals[mask] * b_vals[mask]).mean() * np.sqrt(2) # Rough estimate related to S in CHSH
     return 0
 
 def get_bell_test_input_from_user(num_pairs):
     """Gets bell test data input from the user for a specified number of pairs."""
-    bell_data = []
+    alice_bases, alice_results, bob_bases, bob_results = [], [], [], []
     print(f"Please enter the measurement results for {num_pairs} Bell pairs.")
     for i in range(num_pairs):
         print(f"\n--- Pair {i+1} ---")
@@ -110,14 +119,39 @@ def get_bell_test_input_from_user(num_pairs):
                     print("Invalid measurement result for Bob. Please enter '0' or '1'.")
                     continue
 
-                bell_data.append(((alice_basis_idx, alice_result), (bob_basis_idx, bob_result)))
+                alice_bases.append(alice_basis_idx)
+                alice_results.append(int(alice_result))
+                bob_bases.append(bob_basis_idx)
+                bob_results.append(int(bob_result))
                 break  # Move to the next pair
             except ValueError:
                 print("Invalid input. Please enter an integer for the basis index.")
-    return bell_data
+    return tuple(np.asarray(values, dtype=np.int8) for values in (alice_bases, alice_results, bob_bases, bob_results))
+
+def run_e91_batch(num_pairs, rng_seed=0, state="psi_minus"):
+    """Simulates Bell test data for num_pairs pairs in one multi-shot Aer run (rng_seed=None leaves it unseeded)."""
+    from qiskit_aer import AerSimulator
+
+    if num_pairs <= 0:
+        raise ValueError("Number of Bell pairs must be positive.")
+
+    # Spread the pairs over the 9 basis combinations, the first num_pairs % 9
+    # combinations getting one extra pair
+    basis_pairs = [(a, b) for a in range(3) for b in range(3)]
+    counts = [num_pairs // 9 + (k < num_pairs % 9) for k in range(len(basis_pairs))]
+    basis_pairs, counts = zip(*[(pair, count) for pair, count in zip(basis_pairs, counts) if count])
+    circuits = [_bell_template(state, a, b) for a, b in basis_pairs]
+    result = AerSimulator().run(circuits, shots=max(counts), memory=True, seed_simulator=rng_seed).result()
+
+    # Each memory entry is '<bob><alice>' (classical bit 0 is rightmost)
+    memory = ''.join(''.join(result.get_memory(k)[:count]) for k, count in enumerate(counts))
+    outcomes = (np.frombuffer(memory.encode('ascii'), np.uint8) - 48).astype(np.int8).reshape(-1, 2)
+    alice_bases = np.repeat(np.array([a for a, _ in basis_pairs], dtype=np.int8), counts)
+    bob_bases = np.repeat(np.array([b for _, b in basis_pairs], dtype=np.int8), counts)
+    return alice_bases, outcomes[:, 1], bob_bases, outcomes[:, 0]
 
 def e91_protocol_qiskit_user_input():
-    """Runs the E91 protocol using Bell test data input from the user."""
+    """Runs the E91 protocol using Bell test data input from the user or a simulated batch."""
     while True:
         try:
             num_pairs = int(input("Enter the number of Bell pairs for the test: "))
@@ -128,34 +162,45 @@ def e91_protocol_qiskit_user_input():
         except ValueError:
             print("Invalid input. Please enter an integer for the number of pairs.")
 
-    bell_test_data = get_bell_test_input_from_user(num_pairs)
+    while True:
+        mode = input("Enter 0 to input the measurement results yourself, or 1 to simulate them in batch: ").strip()
+        if mode in ['0', '1']:
+            break
+        print("Invalid input. Please enter '0' or '1'.")
+
+    if mode == '1':
+        source = "simulated batch"
+        bell_test_data = run_e91_batch(num_pairs, rng_seed=None)
+    else:
+        source = "user input"
+        bell_test_data = get_bell_test_input_from_user(num_pairs)
 
-    if not bell_test_data:
+    if len(bell_test_data[0]) == 0:
         print("No Bell test data provided.")
         return [], []
 
     # 3. Bell Inequality Test (Simplified CHSH-like)
-    bell_statistic = evaluate_bell_statistic(bell_test_data)
-    print(f"\nEstimated Bell-like statistic (S) from user input: {abs(bell_statistic):.2f}")
+    bell_statistic = evaluate_bell_statistic(*bell_test_data)
+    print(f"\nEstimated Bell-like statistic (S) from {source}: {abs(bell_statistic):.2f}")
 
     bell_violation_threshold = 2.0  # Theoretical limit for classical correlations
 
     if abs(bell_statistic) > bell_violation_threshold:
-        print("Bell inequality violated based on user input. Proceeding with (hypothetical) key generation.")
+        print(f"Bell inequality violated based on {source}. Proceeding with (hypothetical) key generation.")
         # Since we don't have actual key generation with user input, we'll return a placeholder
-        hypothetical_key = [random.randint(0, 1) for _ in range(len(bell_test_data) // 2)]
+        hypothetical_key = [random.randint(0, 1) for _ in range(len(bell_test_data[0]) // 2)]
         return hypothetical_key, hypothetical_key
     else:
-        print("Bell inequality not significantly violated based on user input. Possible eavesdropping or noise. Discarding (hypothetical) key.")
+        print(f"Bell inequality not significantly violated based on {source}. Possible eavesdropping or noise. Discarding (hypothetical) key.")
         return [], []
 
 if __name__ == "__main__":
     alice_key, bob_key = e91_protocol_qiskit_user_input()
 
     if alice_key and bob_key and len(alice_key) == len(bob_key):
-        print("\nSecure key exchange simulation (E91) with user input (hypothetical) successful.")
+        print("\nSecure key exchange simulation (E91) (hypothetical) successful.")
         print(f"Length of hypothetical final key: {len(alice_key)} bits")
         print(f"Alice's hypothetical key: {alice_key}")
         print(f"Bob's hypothetical key: {bob_key}")
     else:
-        print("\nKey exchange simulation (E91) with user input failed or resulted in an empty key.")
\ No newline at end of file
+        print("\nKey exchange simulation (E91) failed or resulted in an empty key.")
\ No newline at end of file